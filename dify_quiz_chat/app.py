@@ -7,7 +7,13 @@ Dify交互式选择题聊天应用
 
 import os
 import json
+import time
+import logging
+import asyncio
+import hashlib
+import functools
 import httpx
+from contextlib import asynccontextmanager
 from typing import Dict, Any, List, Optional
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import HTMLResponse, JSONResponse
@@ -16,11 +22,62 @@ from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 import uvicorn
 from dotenv import load_dotenv
+from fast_response import FastJSONResponse
+from structured_logging import StructuredLogging, elapsed_ms, get_logger, log_event
+from leaderboard import LeaderboardStore
+from item_analysis import ItemAnalyzer
 
 # 加载环境变量
 load_dotenv()
 
-app = FastAPI(title="Dify Quiz Chat", description="基于Dify的交互式选择题聊天应用")
+# 结构化日志（写入挂载的logs目录，由后台线程完成文件I/O）
+structured_logging = StructuredLogging.from_env()
+LOG_DROPPED_REPORT_INTERVAL = float(os.getenv("LOG_DROPPED_REPORT_INTERVAL", "60"))
+logger = get_logger("app")
+
+# 排行榜（定期快照到磁盘，重启时恢复）
+leaderboards = LeaderboardStore.from_env()
+LEADERBOARD_SNAPSHOT_INTERVAL = float(os.getenv("LEADERBOARD_SNAPSHOT_INTERVAL", "30"))
+
+# 题目分析（定期刷新，被标记的题目不再下发）
+item_analyzer = ItemAnalyzer()
+ANSWER_LOG_PATH = os.getenv("ANSWER_LOG_PATH", "data/answers.npz")
+ITEM_ANALYSIS_INTERVAL = float(os.getenv("ITEM_ANALYSIS_INTERVAL", "60"))
+ANSWER_LOG_SAVE_INTERVAL = float(os.getenv("ANSWER_LOG_SAVE_INTERVAL", "60"))
+
+async def run_periodically(interval: float, func, error_event: str):
+    """定期在后台线程中执行func"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(func)
+        except Exception as e:
+            log_event(logger, error_event, level=logging.ERROR, error=str(e))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动和停止日志后台线程，恢复和保存排行榜与答题记录"""
+    structured_logging.start()
+    await asyncio.to_thread(leaderboards.restore)
+    await asyncio.to_thread(item_analyzer.load, ANSWER_LOG_PATH)
+    tasks = [
+        asyncio.create_task(run_periodically(
+            LOG_DROPPED_REPORT_INTERVAL, structured_logging.report_dropped, "log_dropped_report_error"
+        )),
+        asyncio.create_task(run_periodically(LEADERBOARD_SNAPSHOT_INTERVAL, leaderboards.snapshot, "leaderboard_snapshot_error")),
+        asyncio.create_task(run_periodically(ITEM_ANALYSIS_INTERVAL, item_analyzer.refresh, "item_analysis_error")),
+        asyncio.create_task(run_periodically(
+            ANSWER_LOG_SAVE_INTERVAL, functools.partial(item_analyzer.save, ANSWER_LOG_PATH), "answer_log_save_error"
+        )),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.to_thread(leaderboards.snapshot)
+    await asyncio.to_thread(item_analyzer.save, ANSWER_LOG_PATH)
+    structured_logging.stop()
+
+app = FastAPI(title="Dify Quiz Chat", description="基于Dify的交互式选择题聊天应用", lifespan=lifespan)
 
 # 静态文件和模板配置
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -59,6 +116,36 @@ class AnswerResponse(BaseModel):
     explanation: str
     score: int
 
+class LeaderboardEntry(BaseModel):
+    """排行榜条目"""
+    rank: int
+    user_id: str
+    score: int
+
+class LeaderboardResponse(BaseModel):
+    """排行榜响应模型"""
+    topic: Optional[str] = None
+    total_users: int
+    entries: List[LeaderboardEntry]
+
+class UserRankResponse(BaseModel):
+    """用户名次响应模型"""
+    topic: Optional[str] = None
+    user_id: str
+    rank: int
+    score: int
+    total_users: int
+
+class ItemStatsResponse(BaseModel):
+    """题目分析结果模型"""
+    question_id: str
+    answers: int
+    p_value: Optional[float] = None
+    discrimination: Optional[float] = None
+    correct_answer: Optional[str] = None
+    option_distribution: Dict[str, float]
+    flags: List[str]
+
 class DifyQuizGenerator:
     """Dify选择题生成器"""
     
@@ -75,6 +162,7 @@ class DifyQuizGenerator:
         # 构建提示词
         prompt = self._build_quiz_prompt(topic, difficulty, question_count)
         
+        start = time.perf_counter()
         try:
             async with httpx.AsyncClient(timeout=60.0) as client:
                 response = await client.post(
@@ -92,6 +180,14 @@ class DifyQuizGenerator:
                     }
                 )
                 
+                log_event(
+                    logger, "upstream_call",
+                    level=logging.INFO if response.status_code == 200 else logging.WARNING,
+                    status=response.status_code,
+                    duration_ms=elapsed_ms(start),
+                    question_count=question_count,
+                )
+                
                 if response.status_code != 200:
                     raise HTTPException(status_code=response.status_code, detail=f"Dify API错误: {response.text}")
                 
@@ -103,6 +199,7 @@ class DifyQuizGenerator:
                 return quiz_data
                 
         except httpx.RequestError as e:
+            log_event(logger, "upstream_error", level=logging.ERROR, error=str(e), duration_ms=elapsed_ms(start))
             raise HTTPException(status_code=500, detail=f"请求错误: {str(e)}")
     
     def _build_quiz_prompt(self, topic: str, difficulty: str, question_count: int) -> str:
@@ -146,6 +243,12 @@ class DifyQuizGenerator:
 """
         return prompt
     
+    @staticmethod
+    def _question_id(question: str, options: List[str]) -> str:
+        """由题目和选项内容生成稳定的题目ID，同一道题在不同进程、重启前后ID相同"""
+        content = json.dumps([question, options], ensure_ascii=False)
+        return f"q_{hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]}"
+    
     def _parse_quiz_response(self, response_text: str) -> List[QuizResponse]:
         """解析AI返回的选择题数据"""
         try:
@@ -160,7 +263,7 @@ class DifyQuizGenerator:
             data = json.loads(json_str)
             
             questions = []
-            for i, q in enumerate(data.get("questions", [])):
+            for q in data.get("questions", []):
                 options = [q["options"]["A"], q["options"]["B"], q["options"]["C"], q["options"]["D"]]
                 
                 quiz_response = QuizResponse(
@@ -168,13 +271,20 @@ class DifyQuizGenerator:
                     options=options,
                     correct_answer=q["correct_answer"],
                     explanation=q["explanation"],
-                    question_id=f"q_{i+1}_{hash(q['question']) % 10000}"
+                    question_id=self._question_id(q["question"], options)
                 )
                 questions.append(quiz_response)
             
             return questions
             
         except (json.JSONDecodeError, KeyError, ValueError) as e:
+            log_event(
+                logger, "parse_failure",
+                level=logging.WARNING,
+                error=f"{type(e).__name__}: {e}",
+                response_length=len(response_text),
+                response_preview=response_text[:200],
+            )
             # 如果解析失败，返回一个示例题目
             return [QuizResponse(
                 question="基础问题（解析失败，返回示例）",
@@ -190,12 +300,37 @@ quiz_generator = DifyQuizGenerator(DIFY_API_KEY, DIFY_BASE_URL)
 # 存储题目和答案（实际应用中应使用数据库）
 quiz_storage = {}
 
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    """记录请求日志"""
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        log_event(
+            logger, "request",
+            level=logging.ERROR,
+            method=request.method,
+            path=request.url.path,
+            status=500,
+            duration_ms=elapsed_ms(start),
+        )
+        raise
+    log_event(
+        logger, "request",
+        method=request.method,
+        path=request.url.path,
+        status=response.status_code,
+        duration_ms=elapsed_ms(start),
+    )
+    return response
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """主页"""
     return templates.TemplateResponse("index.html", {"request": request})
 
-@app.post("/api/generate-quiz", response_model=List[QuizResponse])
+@app.post("/api/generate-quiz", response_model=List[QuizResponse], response_class=FastJSONResponse)
 async def generate_quiz(request: QuizRequest):
     """生成选择题"""
     try:
@@ -205,6 +340,12 @@ async def generate_quiz(request: QuizRequest):
             question_count=request.question_count
         )
         
+        # 去掉题目分析标记为问题的题目，全部被标记时仍保留原题目
+        kept = [q for q in questions if not item_analyzer.is_retired(q.question_id)]
+        if len(kept) < len(questions):
+            log_event(logger, "questions_retired", topic=request.topic, retired=len(questions) - len(kept))
+            questions = kept or questions
+        
         # 存储题目到内存中（实际应用中应使用数据库）
         for question in questions:
             quiz_storage[question.question_id] = {
@@ -213,7 +354,8 @@ async def generate_quiz(request: QuizRequest):
                 "topic": request.topic
             }
         
-        return questions
+        # 题目已在解析时完成校验，直接编码返回，避免response_model二次校验
+        return FastJSONResponse(questions)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -225,11 +367,19 @@ async def submit_answer(request: AnswerRequest):
         raise HTTPException(status_code=404, detail="题目不存在")
     
     stored_data = quiz_storage[request.question_id]
-    is_correct = request.selected_answer.upper() == stored_data["correct_answer"].upper()
+    # 统一规范化一次，判分和题目分析使用同一个选项，避免" a"在两处被判为不同答案
+    selected_answer = request.selected_answer.strip().upper()
+    is_correct = selected_answer == stored_data["correct_answer"].strip().upper()
     
     # 计算分数（简单示例）
     score = 10 if is_correct else 0
     
+    # 更新全局榜和主题榜，并记录答题用于题目分析；同一用户重复作答同一题不再计入
+    if leaderboards.record_answer(request.user_id, request.question_id, stored_data["topic"], score):
+        item_analyzer.record(
+            request.question_id, selected_answer, stored_data["correct_answer"], is_correct, request.user_id
+        )
+    
     return AnswerResponse(
         is_correct=is_correct,
         correct_answer=stored_data["correct_answer"],
@@ -237,6 +387,36 @@ async def submit_answer(request: AnswerRequest):
         score=score
     )
 
+@app.get("/api/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(topic: Optional[str] = None, limit: int = 10):
+    """获取排行榜前N名，不指定topic时返回全局榜"""
+    board = leaderboards.get_board(topic)
+    if board is None:
+        raise HTTPException(status_code=404, detail="该主题暂无排行榜")
+    
+    limit = max(1, min(limit, 100))
+    entries = [
+        LeaderboardEntry(rank=i + 1, user_id=user_id, score=score)
+        for i, (user_id, score) in enumerate(board.top(limit))
+    ]
+    return LeaderboardResponse(topic=topic, total_users=len(board), entries=entries)
+
+@app.get("/api/leaderboard/rank", response_model=UserRankResponse)
+async def get_user_rank(user_id: str, topic: Optional[str] = None):
+    """获取用户在排行榜中的名次"""
+    board = leaderboards.get_board(topic)
+    result = board.get_rank(user_id) if board is not None else None
+    if result is None:
+        raise HTTPException(status_code=404, detail="用户未上榜")
+    
+    rank, score = result
+    return UserRankResponse(topic=topic, user_id=user_id, rank=rank, score=score, total_users=len(board))
+
+@app.get("/api/item-analysis", response_model=List[ItemStatsResponse])
+async def get_item_analysis(flagged_only: bool = False):
+    """获取题目分析结果（p值、选项分布、区分度和标记原因）"""
+    return await asyncio.to_thread(item_analyzer.report, flagged_only)
+
 @app.get("/api/quiz-history")
 async def get_quiz_history(user_id: str = "default_user"):
     """获取答题历史"""
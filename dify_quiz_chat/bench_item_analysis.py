@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题目分析基准测试
+模拟数百万条答题记录，测量批量载入、全量分析和增量更新的耗时
+运行：python bench_item_analysis.py [答题记录数]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from item_analysis import OPTION_LABELS, ItemAnalyzer
+
+ANSWERS = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+QUESTIONS = 20_000
+USERS = 200_000
+INCREMENT = 10_000
+
+QUESTION_IDS = np.array([f"q_{i}" for i in range(QUESTIONS)])
+USER_IDS = np.array([f"user_{i}" for i in range(USERS)])
+
+
+def generate(n: int, rng: np.random.Generator, keys: np.ndarray, ability: np.ndarray):
+    """生成答题记录：能力越高的用户越可能选中正确答案"""
+    q = rng.integers(0, QUESTIONS, n)
+    u = rng.integers(0, USERS, n)
+    correct = rng.random(n) < ability[u]
+    wrong = (keys[q] + rng.integers(1, len(OPTION_LABELS), n)) % len(OPTION_LABELS)
+    option = np.where(correct, keys[q], wrong)
+    labels = np.array(list(OPTION_LABELS))
+    return (
+        QUESTION_IDS[q],
+        labels[option],
+        labels[keys[q]],
+        correct,
+        USER_IDS[u],
+    )
+
+
+def timed(name: str, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{name:<24} {time.perf_counter() - start:>8.3f} s")
+    return result
+
+
+def main():
+    """主函数"""
+    print(f"🚀 题目分析基准测试（{ANSWERS} 条答题记录，{QUESTIONS} 道题，{USERS} 名用户）")
+    print("=" * 60)
+
+    rng = np.random.default_rng(42)
+    keys = rng.integers(0, len(OPTION_LABELS), QUESTIONS)
+    ability = rng.beta(4, 3, USERS)
+
+    records = timed("生成数据", lambda: generate(ANSWERS, rng, keys, ability))
+    analyzer = ItemAnalyzer()
+    timed("批量载入（编码+计数）", lambda: analyzer.extend(*records))
+    timed("全量分析（区分度+标记）", analyzer.refresh)
+
+    batch = generate(INCREMENT, rng, keys, ability)
+    for qid, selected, key, correct, uid in zip(*batch):
+        analyzer.record(str(qid), str(selected), str(key), bool(correct), str(uid))
+    timed(f"增量刷新（{INCREMENT} 条）", analyzer.refresh)
+
+    print(f"\n被标记题目: {len(analyzer.retired_ids)} / {len(analyzer.questions)}")
+    print(f"区分度中位数: {np.nanmedian(analyzer.discrimination):.3f}")
+
+
+if __name__ == "__main__":
+    main()
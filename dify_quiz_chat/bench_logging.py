@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构化日志延迟基准测试
+在事件循环上模拟并发请求，对比每条请求日志给调用方增加的延迟：
+不记录日志、同步写文件、队列后台写文件
+运行：python bench_logging.py [并发请求数]
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import List
+
+from structured_logging import JsonFormatter, StructuredLogging, log_event
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+CONCURRENCY = 200
+
+
+async def simulate(logger: logging.Logger, requests: int) -> List[float]:
+    """并发模拟请求，返回每次记录日志的耗时（微秒）"""
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def handle(i: int):
+        async with semaphore:
+            await asyncio.sleep(0)
+            start = time.perf_counter()
+            log_event(
+                logger, "request",
+                method="POST",
+                path="/api/submit-answer",
+                status=200,
+                duration_ms=1.234,
+                request_no=i,
+            )
+            latencies.append((time.perf_counter() - start) * 1e6)
+
+    await asyncio.gather(*(handle(i) for i in range(requests)))
+    return latencies
+
+
+def report(name: str, latencies: List[float], extra: str = ""):
+    """输出延迟统计"""
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{name:<12} {statistics.mean(latencies):>9.2f} {p50:>9.2f} {p99:>9.2f} {latencies[-1]:>10.1f}  {extra}")
+
+
+def run_disabled():
+    logger = logging.getLogger("bench.disabled")
+    logger.propagate = False
+    logger.setLevel(logging.CRITICAL)
+    report("不记录", asyncio.run(simulate(logger, REQUESTS)))
+
+
+def run_sync(log_dir: Path):
+    logger = logging.getLogger("bench.sync")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = RotatingFileHandler(log_dir / "sync.log", maxBytes=5 * 1024 * 1024, backupCount=2, encoding="utf-8")
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    report("同步写文件", asyncio.run(simulate(logger, REQUESTS)))
+    logger.removeHandler(handler)
+    handler.close()
+
+
+def run_queue(log_dir: Path, queue_size: int, sample_rate: float = 1.0):
+    setup = StructuredLogging(
+        log_dir=str(log_dir),
+        filename=f"queue_{queue_size}_{sample_rate}.log",
+        max_bytes=5 * 1024 * 1024,
+        backup_count=2,
+        queue_size=queue_size,
+        sample_rates={"request": sample_rate},
+    )
+    setup.start()
+    # 与app.py一致，通过quiz子日志记录器写入
+    logger = logging.getLogger("quiz.bench")
+    latencies = asyncio.run(simulate(logger, REQUESTS))
+    dropped = setup.dropped
+    setup.stop()
+    name = f"队列({queue_size})" if sample_rate >= 1.0 else f"队列采样{sample_rate}"
+    report(name, latencies, f"丢弃 {dropped} 条")
+
+
+def main():
+    """主函数"""
+    print(f"🚀 结构化日志延迟基准测试（{REQUESTS} 个请求，并发 {CONCURRENCY}）")
+    print("=" * 72)
+    print(f"{'方式':<12} {'平均(μs)':>9} {'p50(μs)':>9} {'p99(μs)':>9} {'最大(μs)':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp)
+        run_disabled()
+        run_sync(log_dir)
+        run_queue(log_dir, queue_size=10000)
+        run_queue(log_dir, queue_size=10000, sample_rate=0.1)
+        # 小队列模拟写入跟不上的情况：丢弃计数而不是阻塞
+        run_queue(log_dir, queue_size=100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/api/generate-quiz 响应序列化微基准测试
+对比FastAPI默认路径（response_model二次校验 + 标准库json）与快速响应路径
+运行：python bench_serialization.py
+"""
+
+import json
+import timeit
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app import QuizResponse
+from fast_response import JSON_BACKEND, FastJSONResponse
+
+QUESTION_COUNTS = [1, 10, 50]
+
+# 与FastAPI在response_model下的处理等价：模型转字典 -> 按response_model校验 -> 序列化 -> json.dumps
+_response_adapter = TypeAdapter(List[QuizResponse])
+
+
+def build_questions(count: int) -> List[QuizResponse]:
+    """构造与_parse_quiz_response输出相同形状的题目"""
+    return [
+        QuizResponse(
+            question=f"第{i + 1}题：Python中哪个关键字用于定义函数？",
+            options=["function", "def", "define", "func"],
+            correct_answer="B",
+            explanation="在Python中，使用'def'关键字来定义函数。这是Python的语法规则。",
+            question_id=f"q_{i + 1}_{i * 37 % 10000}",
+        )
+        for i in range(count)
+    ]
+
+
+def default_path(questions: List[QuizResponse]) -> bytes:
+    """FastAPI默认的response_model路径"""
+    content = [q.model_dump(by_alias=True) for q in questions]
+    validated = _response_adapter.validate_python(content)
+    data = _response_adapter.dump_python(validated, mode="json")
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def fast_path(questions: List[QuizResponse]) -> bytes:
+    """快速响应路径"""
+    return FastJSONResponse(questions).body
+
+
+def bench(func, questions: List[QuizResponse], number: int) -> float:
+    """返回单次调用的最佳耗时（微秒）"""
+    timings = timeit.repeat(lambda: func(questions), number=number, repeat=5)
+    return min(timings) / number * 1e6
+
+
+def main():
+    """主函数"""
+    print(f"🚀 响应序列化微基准测试（JSON后端: {JSON_BACKEND}）")
+    print("=" * 60)
+    print(f"{'题目数':>6} {'默认路径(μs)':>14} {'快速路径(μs)':>14} {'加速比':>8}")
+
+    for count in QUESTION_COUNTS:
+        questions = build_questions(count)
+        # 两条路径输出内容必须一致
+        assert json.loads(default_path(questions)) == json.loads(fast_path(questions))
+
+        number = max(200, 20000 // count)
+        default_us = bench(default_path, questions, number)
+        fast_us = bench(fast_path, questions, number)
+        print(f"{count:>6} {default_us:>14.1f} {fast_us:>14.1f} {default_us / fast_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
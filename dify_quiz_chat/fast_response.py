@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+快速JSON响应
+对已经构建好的Pydantic模型直接编码输出，跳过FastAPI的response_model二次校验
+优先使用orjson，未安装时回退到标准库json
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于运行环境
+    orjson = None
+
+# 当前使用的JSON编码后端，便于日志和基准测试输出
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(content: Any) -> bytes:
+    """将内容编码为UTF-8 JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    # 与FastAPI默认JSONResponse保持一致的输出格式
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    快速JSON响应
+    直接返回Response时FastAPI不会再按response_model校验和序列化，
+    因此只应用于由服务端自己构建、已经校验过的模型
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            content = content.model_dump()
+        elif isinstance(content, (list, tuple)):
+            content = [
+                item.model_dump() if isinstance(item, BaseModel) else item
+                for item in content
+            ]
+        return dumps(content)
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题目分析（Item Analysis）
+将答题记录存为NumPy列式数组，批量计算每道题的通过率（p值）、选项分布
+和点二列相关区分度，用于找出过易、过难或正确答案可能有误的题目
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from structured_logging import elapsed_ms, get_logger, log_event
+
+logger = get_logger("item_analysis")
+
+OPTION_LABELS = "ABCD"
+NUM_OPTIONS = len(OPTION_LABELS)
+_OPTION_CODES = {label: i for i, label in enumerate(OPTION_LABELS)}
+
+# 会让题目不再下发的标记；unused_distractor只出现在报告中
+RETIRING_FLAGS = ("too_easy", "too_hard", "suspect_key", "low_discrimination")
+
+
+_HASH_PRIME = np.uint64(1099511628211)
+_CHECK_PRIME = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _factorize(values) -> tuple:
+    """
+    将字符串数组分解为(去重值, 每个元素在去重值中的下标)
+    把定长Unicode数组的原始字节向量化哈希成uint64，只对整数去重，比直接对字符串排序快得多；
+    另算一个独立的校验哈希，发现哈希冲突时回退到np.unique
+    """
+    values = np.asarray(values)
+    if values.dtype.kind != "U":
+        values = values.astype(str)
+    values = np.ascontiguousarray(values)
+    if len(values) == 0 or values.dtype.itemsize == 0:
+        return np.unique(values, return_inverse=True)
+
+    # 按8字节一组读取，宽度不是8的倍数时最后4字节单独作为一组
+    raw = values.view(np.uint8).reshape(len(values), values.dtype.itemsize)
+    full = raw.shape[1] // 8 * 8
+    columns = list(raw[:, :full].view(np.uint64).T)
+    if full < raw.shape[1]:
+        columns.append(raw[:, full:].view(np.uint32)[:, 0].astype(np.uint64))
+    # 定长数组按最长元素补0，跳过全为0的尾部列
+    while len(columns) > 1 and not columns[-1].any():
+        columns.pop()
+
+    hashes = np.zeros(len(values), dtype=np.uint64)
+    checks = np.zeros(len(values), dtype=np.uint64)
+    for column in columns:
+        hashes *= _HASH_PRIME
+        hashes ^= column
+        checks += column
+        checks *= _CHECK_PRIME
+
+    unique_hashes, inverse = np.unique(hashes, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    first = np.empty(len(unique_hashes), dtype=np.intp)
+    first[inverse] = np.arange(len(values))
+    if not (checks[first][inverse] == checks).all():
+        return np.unique(values, return_inverse=True)
+    return values[first], inverse
+
+
+class _Codebook:
+    """字符串ID到连续整数编码的映射"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value: str) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, values: np.ndarray) -> np.ndarray:
+        """批量编码，只对去重后的值做Python层查找"""
+        uniques, inverse = _factorize(values)
+        codes = np.fromiter((self.code(str(v)) for v in uniques), dtype=np.int32, count=len(uniques))
+        return codes[inverse]
+
+
+# 单字符选项按码点直接查表：A~D、a~d编码为0~3，其余（含码点≥128）为-1
+_OPTION_TABLE = np.full(129, -1, dtype=np.int8)
+for _i, _label in enumerate(OPTION_LABELS):
+    _OPTION_TABLE[ord(_label)] = _OPTION_TABLE[ord(_label.lower())] = _i
+
+
+def _encode_options(answers) -> np.ndarray:
+    """将选项字母编码为0~3，无法识别的选项编码为-1"""
+    answers = np.asarray(answers)
+    if answers.dtype == np.dtype("<U1"):
+        return _OPTION_TABLE[np.minimum(answers.view(np.uint32), len(_OPTION_TABLE) - 1)]
+    uniques, inverse = _factorize(answers)
+    codes = np.fromiter(
+        (_OPTION_CODES.get(str(v).strip().upper(), -1) for v in uniques),
+        dtype=np.int8,
+        count=len(uniques),
+    )
+    return codes[inverse]
+
+
+def _grow(array: np.ndarray, size: int, fill=0) -> np.ndarray:
+    """按题目/用户数量扩展数组，新增部分填充fill"""
+    if len(array) >= size:
+        return array
+    grown = np.full((size,) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class ItemAnalyzer:
+    """
+    答题记录的列式存储与题目分析
+    计数类指标（p值、选项分布、用户总分）随新记录增量更新；
+    区分度依赖用户总分，每次刷新时在全部记录上向量化重算
+    """
+
+    def __init__(
+        self,
+        min_answers: int = 30,
+        easy_threshold: float = 0.9,
+        hard_threshold: float = 0.2,
+        min_discrimination: float = 0.0,
+        min_wrong_answers: int = 10,
+    ):
+        self.min_answers = min_answers
+        self.easy_threshold = easy_threshold
+        self.hard_threshold = hard_threshold
+        self.min_discrimination = min_discrimination
+        self.min_wrong_answers = min_wrong_answers
+
+        self.questions = _Codebook()
+        self.users = _Codebook()
+
+        # 列式答题记录，按批次存放，计算时再拼接
+        self._chunks: Dict[str, List[np.ndarray]] = {"question": [], "user": [], "option": [], "correct": []}
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+
+        # 增量维护的计数
+        self.keys = np.full(0, -1, dtype=np.int8)
+        self.answer_counts = np.zeros(0, dtype=np.int64)
+        self.correct_counts = np.zeros(0, dtype=np.int64)
+        self.option_counts = np.zeros((0, NUM_OPTIONS), dtype=np.int64)
+        self.user_answer_counts = np.zeros(0, dtype=np.int64)
+        self.user_correct_counts = np.zeros(0, dtype=np.int64)
+
+        self.discrimination = np.zeros(0, dtype=np.float64)
+        self._discrimination_stale = False
+
+        # 逐条提交的记录先暂存，刷新时批量写入
+        self._pending: List[tuple] = []
+        self._pending_lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+
+        # 已写入文件的记录条数，没有新记录时跳过保存
+        self._saved_answers = 0
+        self._save_lock = threading.Lock()
+
+        # 提供给服务路径的被标记题目集合，整体替换，读取无需加锁
+        self.retired_ids: Set[str] = set()
+
+    def __len__(self) -> int:
+        return int(self.answer_counts.sum())
+
+    def record(self, question_id: str, selected_answer: str, correct_answer: str, is_correct: bool, user_id: str) -> None:
+        """记录一次答题（O(1)，在下次refresh时写入列式存储）"""
+        with self._pending_lock:
+            self._pending.append((question_id, selected_answer, correct_answer, is_correct, user_id))
+
+    def extend(self, question_ids, selected_answers, correct_answers, is_correct, user_ids) -> None:
+        """批量写入答题记录，参数均为等长的数组或列表"""
+        with self._compute_lock:
+            self._encode_and_extend(question_ids, selected_answers, correct_answers, is_correct, user_ids)
+
+    def _encode_and_extend(self, question_ids, selected_answers, correct_answers, is_correct, user_ids) -> None:
+        if len(question_ids) == 0:
+            return
+        self._extend(
+            self.questions.encode(question_ids),
+            self.users.encode(user_ids),
+            _encode_options(selected_answers),
+            _encode_options(correct_answers),
+            np.asarray(is_correct, dtype=bool),
+        )
+
+    def _extend(self, q: np.ndarray, u: np.ndarray, opt: np.ndarray, key: np.ndarray, is_correct: np.ndarray) -> None:
+        """写入已编码的答题记录并增量更新计数"""
+        nq, nu = len(self.questions), len(self.users)
+
+        # 正确答案以最后一次出现为准
+        self.keys = _grow(self.keys, nq, fill=-1)
+        self.keys[q] = key
+
+        self.answer_counts = _grow(self.answer_counts, nq) + np.bincount(q, minlength=nq)
+        self.correct_counts = _grow(self.correct_counts, nq) + np.bincount(q, weights=is_correct, minlength=nq).astype(np.int64)
+        valid = opt >= 0
+        self.option_counts = _grow(self.option_counts, nq) + np.bincount(
+            q[valid] * NUM_OPTIONS + opt[valid], minlength=nq * NUM_OPTIONS
+        ).reshape(nq, NUM_OPTIONS)
+        self.user_answer_counts = _grow(self.user_answer_counts, nu) + np.bincount(u, minlength=nu)
+        self.user_correct_counts = _grow(self.user_correct_counts, nu) + np.bincount(u, weights=is_correct, minlength=nu).astype(np.int64)
+
+        for name, values in (("question", q), ("user", u), ("option", opt), ("correct", is_correct)):
+            self._chunks[name].append(values)
+        self._columns = None
+        self._discrimination_stale = True
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """全部答题记录的列式数组（question/user/option为编码，correct为布尔）"""
+        if self._columns is None:
+            self._columns = {
+                name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+                for name, chunks in self._chunks.items()
+            }
+            # 合并为单个批次，避免重复拼接
+            self._chunks = {name: [values] for name, values in self._columns.items()}
+        return self._columns
+
+    @property
+    def p_values(self) -> np.ndarray:
+        """每道题的通过率（答对比例），无人作答为NaN"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.correct_counts / self.answer_counts
+
+    @property
+    def option_distribution(self) -> np.ndarray:
+        """每道题各选项被选比例，形状为(题目数, 4)"""
+        totals = self.option_counts.sum(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.option_counts / totals
+
+    def _compute_discrimination(self) -> np.ndarray:
+        """
+        点二列相关区分度
+        每条记录的答对与否，与该用户去掉本题后的正确率（rest score）之间的相关系数，
+        仅作答过一题的用户不参与计算
+        """
+        cols = self.columns()
+        q, u = cols["question"], cols["user"]
+        x = cols["correct"].astype(np.float64)
+        n_user = self.user_answer_counts[u]
+        mask = n_user > 1
+        q, x = q[mask], x[mask]
+        y = (self.user_correct_counts[u[mask]] - x) / (n_user[mask] - 1)
+
+        nq = len(self.questions)
+        n = np.bincount(q, minlength=nq).astype(np.float64)
+        sx = np.bincount(q, weights=x, minlength=nq)
+        sy = np.bincount(q, weights=y, minlength=nq)
+        sxy = np.bincount(q, weights=x * y, minlength=nq)
+        syy = np.bincount(q, weights=y * y, minlength=nq)
+
+        cov = n * sxy - sx * sy
+        var_x = n * sx - sx * sx  # x为0/1，x²=x
+        var_y = n * syy - sy * sy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = cov / np.sqrt(var_x * var_y)
+        r[(var_x <= 0) | (var_y <= 1e-12)] = np.nan
+        return r
+
+    def _flag(self) -> Dict[str, np.ndarray]:
+        """按阈值标记问题题目，只考虑作答次数达到min_answers的题目"""
+        enough = self.answer_counts >= self.min_answers
+        p = self.p_values
+        disc = _grow(self.discrimination, len(self.questions), fill=np.nan)
+        has_key = self.keys >= 0
+        is_key = np.arange(NUM_OPTIONS) == self.keys[:, None].astype(np.int64)
+        key_counts = np.where(is_key, self.option_counts, 0).sum(axis=1)
+        distractor_counts = np.where(is_key, -1, self.option_counts)
+        wrong_counts = self.answer_counts - self.correct_counts
+        # 相关系数的标准误约为1/√n，低于阈值超过2个标准误才认为区分度确实偏低
+        with np.errstate(invalid="ignore", divide="ignore"):
+            disc_margin = 2 / np.sqrt(self.answer_counts)
+        with np.errstate(invalid="ignore"):
+            return {
+                "too_easy": enough & (p > self.easy_threshold),
+                "too_hard": enough & (p < self.hard_threshold),
+                # 错答足够多，且有干扰项被选得比正确答案还多：正确答案很可能有误
+                "suspect_key": enough & has_key & (wrong_counts >= self.min_wrong_answers)
+                & (distractor_counts.max(axis=1) > key_counts),
+                # 有干扰项从未被选过：干扰项较弱，仅用于报告
+                "unused_distractor": enough & has_key & (distractor_counts == 0).any(axis=1),
+                "low_discrimination": enough & (disc + disc_margin < self.min_discrimination),
+            }
+
+    def refresh(self) -> Set[str]:
+        """写入暂存记录、重算区分度并更新被标记题目集合"""
+        start = time.perf_counter()
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        with self._compute_lock:
+            if pending:
+                self._encode_and_extend(*zip(*pending))
+            if self._discrimination_stale:
+                self.discrimination = self._compute_discrimination()
+                self._discrimination_stale = False
+            flags = self._flag()
+            flagged = np.zeros(len(self.questions), dtype=bool)
+            for name in RETIRING_FLAGS:
+                flagged |= flags[name]
+            self.retired_ids = {self.questions.values[i] for i in np.flatnonzero(flagged)}
+
+        if pending:
+            log_event(
+                logger, "item_analysis_refresh",
+                new_answers=len(pending),
+                answers=len(self),
+                questions=len(self.questions),
+                flagged=len(self.retired_ids),
+                duration_ms=elapsed_ms(start),
+            )
+        return self.retired_ids
+
+    def is_retired(self, question_id: str) -> bool:
+        """题目是否已被标记为问题题目"""
+        return question_id in self.retired_ids
+
+    def report(self, flagged_only: bool = False) -> List[Dict[str, Any]]:
+        """每道题的分析结果（基于最近一次refresh）"""
+        with self._compute_lock:
+            flags = self._flag()
+            p = self.p_values
+            dist = self.option_distribution
+            disc = _grow(self.discrimination, len(self.questions), fill=np.nan)
+            rows = []
+            for i, question_id in enumerate(self.questions.values):
+                reasons = [name for name, mask in flags.items() if mask[i]]
+                if flagged_only and not reasons:
+                    continue
+                rows.append({
+                    "question_id": question_id,
+                    "answers": int(self.answer_counts[i]),
+                    "p_value": None if np.isnan(p[i]) else round(float(p[i]), 4),
+                    "discrimination": None if np.isnan(disc[i]) else round(float(disc[i]), 4),
+                    "correct_answer": OPTION_LABELS[self.keys[i]] if self.keys[i] >= 0 else None,
+                    "option_distribution": {
+                        label: 0.0 if np.isnan(dist[i, j]) else round(float(dist[i, j]), 4)
+                        for j, label in enumerate(OPTION_LABELS)
+                    },
+                    "flags": reasons,
+                })
+            return rows
+
+    def save(self, path: str) -> bool:
+        """将答题记录保存为npz文件（先写临时文件再原子替换），没有新记录时跳过"""
+        self.refresh()
+        with self._save_lock:
+            start = time.perf_counter()
+            with self._compute_lock:
+                cols = self.columns()
+                answers = len(cols["question"])
+                if answers == self._saved_answers:
+                    return False
+                keys = self.keys.copy()
+                questions = np.array(self.questions.values, dtype=str)
+                users = np.array(self.users.values, dtype=str)
+
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    question=cols["question"], user=cols["user"], option=cols["option"], correct=cols["correct"],
+                    keys=keys, question_ids=questions, user_ids=users,
+                )
+            os.replace(tmp_path, path)
+            self._saved_answers = answers
+
+        log_event(logger, "answer_log_save", answers=answers, duration_ms=elapsed_ms(start))
+        return True
+
+    def load(self, path: str) -> bool:
+        """从npz文件恢复答题记录，文件不存在时返回False"""
+        path = Path(path)
+        if not path.exists():
+            return False
+        start = time.perf_counter()
+        with np.load(path) as data, self._compute_lock:
+            # 空分析器载入后与文件内容一致，无需立即重新保存
+            if not self._chunks["question"]:
+                self._saved_answers = len(data["question"])
+            # 文件中的编码映射到当前编码，已有记录时同样适用
+            question_map = np.array([self.questions.code(v) for v in data["question_ids"].tolist()], dtype=np.int32)
+            user_map = np.array([self.users.code(v) for v in data["user_ids"].tolist()], dtype=np.int32)
+            question = data["question"]
+            if len(question):
+                self._extend(
+                    question_map[question],
+                    user_map[data["user"]],
+                    data["option"],
+                    data["keys"][question],
+                    data["correct"],
+                )
+        self.refresh()
+        log_event(
+            logger, "item_analysis_load",
+            answers=len(self),
+            questions=len(self.questions),
+            duration_ms=elapsed_ms(start),
+        )
+        return True
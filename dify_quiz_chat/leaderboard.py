@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排行榜
+全局和按主题的排行榜，基于有序列表（SortedList）维护，
+更新、名次查询均为O(log n)，前K名查询为O(log n + K)，并支持快照到磁盘；
+用户已作答的题目（去重记录）单独追加写入JSON Lines文件，不进入排行榜快照
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+
+from fast_response import dumps
+from structured_logging import elapsed_ms, get_logger, log_event
+
+logger = get_logger("leaderboard")
+
+
+class Leaderboard:
+    """
+    单个排行榜
+    按分数从高到低排序，分数相同时按user_id排序，保证名次稳定
+    """
+
+    def __init__(self, scores: Optional[Dict[str, int]] = None):
+        self._scores: Dict[str, int] = dict(scores or {})
+        # 存储(-分数, user_id)，使升序遍历即为名次顺序
+        self._ranking = SortedList((-score, user_id) for user_id, score in self._scores.items())
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def add_score(self, user_id: str, delta: int) -> int:
+        """为用户累加分数，返回新的总分"""
+        with self._lock:
+            old = self._scores.get(user_id)
+            if old is not None:
+                self._ranking.remove((-old, user_id))
+            new = (old or 0) + delta
+            self._scores[user_id] = new
+            self._ranking.add((-new, user_id))
+            return new
+
+    def get_score(self, user_id: str) -> Optional[int]:
+        """获取用户总分，未上榜返回None"""
+        return self._scores.get(user_id)
+
+    def get_rank(self, user_id: str) -> Optional[Tuple[int, int]]:
+        """获取用户的(名次, 总分)，名次从1开始，未上榜返回None"""
+        with self._lock:
+            score = self._scores.get(user_id)
+            if score is None:
+                return None
+            return self._ranking.index((-score, user_id)) + 1, score
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        """获取前K名的[(user_id, 总分)]"""
+        with self._lock:
+            return [(user_id, -neg_score) for neg_score, user_id in self._ranking.islice(0, k)]
+
+    def to_dict(self) -> Dict[str, int]:
+        """导出 {user_id: 总分}，用于快照"""
+        with self._lock:
+            return dict(self._scores)
+
+
+class LeaderboardStore:
+    """全局和按主题排行榜的集合"""
+
+    def __init__(self, snapshot_path: Optional[str] = None, answered_path: Optional[str] = None):
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.answered_path = Path(answered_path) if answered_path else None
+        self.global_board = Leaderboard()
+        self.topic_boards: Dict[str, Leaderboard] = {}
+        self._topics_lock = threading.Lock()
+        # 每个用户已计分的题目，同一题只计第一次作答
+        self.answered: Dict[str, Set[str]] = {}
+        # 尚未追加到去重记录文件的 (user_id, question_id)
+        self._pending_answered: List[Tuple[str, str]] = []
+        self._answered_lock = threading.Lock()
+        # 自上次快照以来是否有更新
+        self._version = 0
+        self._snapshot_version = 0
+
+    @classmethod
+    def from_env(cls) -> "LeaderboardStore":
+        """从环境变量读取快照和去重记录路径"""
+        return cls(
+            os.getenv("LEADERBOARD_SNAPSHOT_PATH", "data/leaderboards.json"),
+            os.getenv("LEADERBOARD_ANSWERED_PATH", "data/answered.jsonl"),
+        )
+
+    def get_board(self, topic: Optional[str] = None) -> Optional[Leaderboard]:
+        """获取排行榜，topic为空时返回全局榜，主题不存在返回None"""
+        if not topic:
+            return self.global_board
+        return self.topic_boards.get(topic)
+
+    def record_answer(self, user_id: str, question_id: str, topic: str, score: int) -> bool:
+        """
+        记录用户对某题的作答得分，只有第一次作答计入排行榜
+        返回是否为第一次作答
+        """
+        with self._answered_lock:
+            answered = self.answered.setdefault(user_id, set())
+            if question_id in answered:
+                return False
+            answered.add(question_id)
+            self._pending_answered.append((user_id, question_id))
+        self.record_score(user_id, topic, score)
+        return True
+
+    def record_score(self, user_id: str, topic: str, score: int) -> None:
+        """记录一次答题得分，同时更新全局榜和主题榜"""
+        board = self.topic_boards.get(topic)
+        if board is None:
+            with self._topics_lock:
+                board = self.topic_boards.setdefault(topic, Leaderboard())
+        board.add_score(user_id, score)
+        self.global_board.add_score(user_id, score)
+        self._version += 1
+
+    @property
+    def dirty(self) -> bool:
+        """是否有尚未写入快照的更新"""
+        return self._version != self._snapshot_version
+
+    def snapshot(self) -> bool:
+        """
+        将排行榜写入快照文件（先写临时文件再原子替换），新的去重记录追加到去重记录文件，无更新时跳过
+        各榜单依次复制，全局榜和主题榜之间可能相差几次并发的更新
+        """
+        if self.snapshot_path is None or not self.dirty:
+            return False
+        start = time.perf_counter()
+        version = self._version
+        # 先复制榜单，最后取去重记录：record_answer先登记去重再加分，
+        # 因此写入的去重记录覆盖快照中的所有得分
+        with self._topics_lock:
+            topic_boards = list(self.topic_boards.items())
+        data = {
+            "global": self.global_board.to_dict(),
+            "topics": {topic: board.to_dict() for topic, board in topic_boards},
+        }
+        with self._answered_lock:
+            pending = len(self._pending_answered)
+            new_answered = self._pending_answered[:pending]
+
+        # 先追加去重记录再替换快照：中途失败时宁可少计分，也不会重复计分
+        if self.answered_path is not None and new_answered:
+            self.answered_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.answered_path, "ab") as f:
+                f.write(b"".join(dumps(entry) + b"\n" for entry in new_answered))
+        with self._answered_lock:
+            del self._pending_answered[:pending]
+
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_suffix(self.snapshot_path.suffix + ".tmp")
+        tmp_path.write_bytes(dumps(data))
+        os.replace(tmp_path, self.snapshot_path)
+        self._snapshot_version = version
+
+        log_event(
+            logger, "leaderboard_snapshot",
+            users=len(data["global"]),
+            topics=len(data["topics"]),
+            new_answered=len(new_answered),
+            duration_ms=elapsed_ms(start),
+        )
+        return True
+
+    def restore(self) -> bool:
+        """从快照文件恢复排行榜，并从去重记录文件恢复已作答题目，快照文件不存在时返回False"""
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return False
+        start = time.perf_counter()
+        data = json.loads(self.snapshot_path.read_bytes())
+        self.global_board = Leaderboard(data.get("global", {}))
+        with self._topics_lock:
+            self.topic_boards = {
+                topic: Leaderboard(scores) for topic, scores in data.get("topics", {}).items()
+            }
+        answered = self._load_answered()
+        with self._answered_lock:
+            self.answered = answered
+            self._pending_answered = []
+        self._version = self._snapshot_version = 0
+
+        log_event(
+            logger, "leaderboard_restore",
+            users=len(self.global_board),
+            topics=len(self.topic_boards),
+            answered=sum(len(question_ids) for question_ids in answered.values()),
+            duration_ms=elapsed_ms(start),
+        )
+        return True
+
+    def _load_answered(self) -> Dict[str, Set[str]]:
+        """读取去重记录文件，跳过写入中断导致的不完整行"""
+        answered: Dict[str, Set[str]] = {}
+        if self.answered_path is None or not self.answered_path.exists():
+            return answered
+        with open(self.answered_path, "rb") as f:
+            for line in f:
+                try:
+                    user_id, question_id = json.loads(line)
+                except ValueError:
+                    continue
+                answered.setdefault(user_id, set()).add(question_id)
+        return answered
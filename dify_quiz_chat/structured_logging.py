@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构化JSON日志
+日志记录先放入有界队列，由后台线程写入按大小轮转的日志文件，
+请求处理（事件循环）中不做任何文件I/O
+"""
+
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+LOGGER_NAME = "quiz"
+
+# 标准LogRecord属性之外，通过extra传入的结构化字段
+_EVENT_ATTR = "event"
+_FIELDS_ATTR = "fields"
+
+# 高频事件采样率 {事件名: 采样率}，由StructuredLogging.start设置；
+# 在log_event中创建LogRecord之前判断，被采样丢弃的事件几乎没有开销
+_sample_rates: Dict[str, float] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """将日志记录格式化为单行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, _EVENT_ATTR, None) or record.getMessage(),
+        }
+        fields = getattr(record, _FIELDS_ATTR, None)
+        if fields:
+            data.update(fields)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        elif record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    不阻塞的队列日志处理器
+    队列满时直接丢弃记录并计数，而不是阻塞调用方
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只解析消息和异常文本，JSON格式化留给后台线程
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """停止时等待队列腾出空间再放入结束标记，队列已满也能正常停止"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class StructuredLogging:
+    """结构化日志的启动与停止"""
+
+    def __init__(
+        self,
+        log_dir: str = "logs",
+        filename: str = "app.log",
+        level: int = logging.INFO,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        queue_size: int = 10000,
+        sample_rates: Optional[Dict[str, float]] = None,
+    ):
+        self.log_path = Path(log_dir) / filename
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue_size = queue_size
+        self.sample_rates = sample_rates or {}
+        self.handler: Optional[DroppingQueueHandler] = None
+        self.listener: Optional[DrainingQueueListener] = None
+        # 已通过log_dropped事件报告过的丢弃条数
+        self._reported_dropped = 0
+        self._report_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "StructuredLogging":
+        """从环境变量读取日志配置"""
+        return cls(
+            log_dir=os.getenv("LOG_DIR", "logs"),
+            level=parse_level(os.getenv("LOG_LEVEL", "INFO")),
+            max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+            queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            sample_rates={"request": float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "1.0"))},
+        )
+
+    @property
+    def dropped(self) -> int:
+        """因队列已满而丢弃的日志条数"""
+        return self.handler.dropped if self.handler else 0
+
+    def start(self) -> None:
+        """创建日志目录并启动后台写入线程"""
+        if self.listener is not None:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+
+        file_handler = RotatingFileHandler(
+            self.log_path,
+            maxBytes=self.max_bytes,
+            backupCount=self.backup_count,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(JsonFormatter())
+
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=self.queue_size))
+        self.listener = DrainingQueueListener(self.handler.queue, file_handler)
+        self._reported_dropped = 0
+
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(self.level)
+        logger.addHandler(self.handler)
+        logger.propagate = False
+        _sample_rates.clear()
+        _sample_rates.update(self.sample_rates)
+        self.listener.start()
+
+    def report_dropped(self) -> int:
+        """
+        记录自上次报告以来因队列已满而丢弃的日志条数，返回本次报告的条数
+        log_dropped事件直接写入文件处理器（处理器自带锁，可与后台写入线程并发），
+        不经过可能已满的队列；会做文件I/O，应在工作线程中调用
+        """
+        listener = self.listener
+        if listener is None:
+            return 0
+        with self._report_lock:
+            total = self.handler.dropped
+            dropped = total - self._reported_dropped
+            if not dropped:
+                return 0
+            logger = logging.getLogger(LOGGER_NAME)
+            record = logger.makeRecord(
+                logger.name, logging.WARNING, __file__, 0, "log_dropped", None, None,
+                extra={_EVENT_ATTR: "log_dropped", _FIELDS_ATTR: {"dropped": dropped, "total_dropped": total}},
+            )
+            for handler in listener.handlers:
+                handler.handle(record)
+            self._reported_dropped = total
+            return dropped
+
+    def stop(self) -> None:
+        """写完队列中剩余的日志并停止后台线程"""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.report_dropped()
+        for handler in self.listener.handlers:
+            handler.close()
+        logging.getLogger(LOGGER_NAME).removeHandler(self.handler)
+        _sample_rates.clear()
+        self.listener = None
+
+
+def parse_level(name: str, default: int = logging.INFO) -> int:
+    """将日志级别名称解析为数值，无法识别时返回default"""
+    level = logging.getLevelName(name.strip().upper())
+    return level if isinstance(level, int) else default
+
+
+def get_logger(name: str = "") -> logging.Logger:
+    """获取应用日志记录器"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """
+    记录一条结构化事件日志
+    INFO及以下级别的事件按采样率采样，警告和错误始终保留
+    """
+    if level <= logging.INFO:
+        rate = _sample_rates.get(event)
+        if rate is not None and rate < 1.0 and random.random() >= rate:
+            return
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={_EVENT_ATTR: event, _FIELDS_ATTR: fields})
+
+
+def elapsed_ms(start: float) -> float:
+    """计算从start（time.perf_counter()）到现在的毫秒数"""
+    return round((time.perf_counter() - start) * 1000, 3)
@@ -8,6 +8,10 @@ import asyncio
 import httpx
 import json
 from app import DifyQuizGenerator
+from fast_response import JSON_BACKEND, FastJSONResponse
+from structured_logging import StructuredLogging, get_logger, log_event, parse_level
+from leaderboard import LeaderboardStore
+from item_analysis import ItemAnalyzer
 
 async def test_quiz_generation():
     """测试选择题生成功能"""
@@ -171,6 +175,398 @@ def test_quiz_logic():
     else:
         print("❌ 题目解析失败")
 
+def test_fast_response():
+    """测试快速JSON响应"""
+    print(f"\n⚡ 测试快速JSON响应（后端: {JSON_BACKEND}）...")
+    
+    test_response = '''
+{
+    "questions": [
+        {
+            "question": "中国历史上第一个统一的封建王朝是？",
+            "options": {"A": "夏朝", "B": "商朝", "C": "秦朝", "D": "汉朝"},
+            "correct_answer": "C",
+            "explanation": "秦朝是中国历史上第一个统一的封建王朝。"
+        }
+    ]
+}
+'''
+    
+    generator = DifyQuizGenerator("test", "test")
+    questions = generator._parse_quiz_response(test_response)
+    response = FastJSONResponse(questions)
+    
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == [q.model_dump() for q in questions]
+    # 中文内容应直接以UTF-8输出，而不是\\u转义
+    assert "秦朝".encode("utf-8") in response.body
+    
+    # 未安装orjson时回退到标准库json，输出与FastAPI默认JSONResponse逐字节一致
+    import fast_response
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    
+    orjson_module = fast_response.orjson
+    fast_response.orjson = None
+    try:
+        fallback = FastJSONResponse(questions)
+    finally:
+        fast_response.orjson = orjson_module
+    assert fallback.body == JSONResponse(jsonable_encoder(questions)).body
+    print("✅ 快速JSON响应编码正确（含标准库json回退）")
+
+def test_structured_logging():
+    """测试结构化日志：队列写入、采样和丢弃计数"""
+    print("\n📜 测试结构化日志...")
+    
+    import logging
+    import tempfile
+    from pathlib import Path
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        setup = StructuredLogging(log_dir=tmp, queue_size=5, sample_rates={"request": 0.0})
+        setup.start()
+        logger = get_logger("test")
+        
+        # 暂停后台写入线程，模拟写入跟不上日志产生速度
+        setup.listener.stop()
+        for i in range(10):
+            log_event(logger, "upstream_call", status=200, request_no=i)
+        # 采样率为0的请求日志不进入队列，不计入丢弃
+        log_event(logger, "request", path="/")
+        assert setup.dropped == 5
+        # 运行中定期报告丢弃条数，直接写入文件，不经过已满的队列
+        assert setup.report_dropped() == 5
+        assert setup.report_dropped() == 0
+        setup.listener.start()
+        
+        # 再丢弃2条，停止时只报告上次报告之后的增量
+        setup.listener.stop()
+        for i in range(7):
+            log_event(logger, "upstream_call", status=200, request_no=10 + i)
+        setup.listener.start()
+        setup.stop()
+        
+        lines = [json.loads(line) for line in Path(tmp, "app.log").read_text(encoding="utf-8").splitlines()]
+        events = [line["event"] for line in lines]
+        assert events == ["log_dropped"] + ["upstream_call"] * 10 + ["log_dropped"]
+        assert lines[1]["request_no"] == 0
+        assert (lines[0]["dropped"], lines[0]["total_dropped"]) == (5, 5)
+        assert (lines[-1]["dropped"], lines[-1]["total_dropped"]) == (2, 7)
+        assert logging.getLogger("quiz").handlers == []
+    
+    print("✅ 结构化日志写入、采样和丢弃计数正常")
+
+def test_request_logging_on_error():
+    """测试未处理异常的请求也会记录日志，以及日志级别解析"""
+    print("\n🧯 测试异常请求日志...")
+    
+    import logging
+    import tempfile
+    from pathlib import Path
+    from fastapi.testclient import TestClient
+    import app as app_module
+    
+    assert parse_level("debug") == logging.DEBUG
+    assert parse_level("verbose") == logging.INFO
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        setup = StructuredLogging(log_dir=tmp)
+        setup.start()
+        # 存储数据缺少正确答案字段，接口内部抛出未处理异常
+        app_module.quiz_storage["broken_question"] = {"explanation": "", "topic": "测试"}
+        try:
+            client = TestClient(app_module.app, raise_server_exceptions=False)
+            response = client.post(
+                "/api/submit-answer",
+                json={"question_id": "broken_question", "selected_answer": "A", "user_id": "test_user"},
+            )
+        finally:
+            del app_module.quiz_storage["broken_question"]
+            setup.stop()
+        
+        assert response.status_code == 500
+        lines = [json.loads(line) for line in Path(tmp, "app.log").read_text(encoding="utf-8").splitlines()]
+        requests = [line for line in lines if line["event"] == "request"]
+        assert requests[-1]["status"] == 500 and requests[-1]["level"] == "ERROR"
+        assert requests[-1]["path"] == "/api/submit-answer"
+    
+    print("✅ 异常请求已记录为500错误日志")
+
+def test_leaderboard():
+    """测试排行榜：名次、前K名、并发读写和快照恢复"""
+    print("\n🏆 测试排行榜...")
+    
+    import tempfile
+    import threading
+    from pathlib import Path
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LeaderboardStore(str(Path(tmp, "leaderboards.json")))
+        store.record_score("alice", "数学", 10)
+        store.record_score("bob", "数学", 10)
+        store.record_score("bob", "中国历史", 10)
+        store.record_score("carol", "中国历史", 0)
+        
+        assert store.global_board.top(2) == [("bob", 20), ("alice", 10)]
+        assert store.global_board.get_rank("carol") == (3, 0)
+        # 分数相同时按user_id排序
+        assert store.get_board("数学").get_rank("alice") == (1, 10)
+        assert store.get_board("物理") is None
+        
+        # 写入的同时并发读取
+        def writer(n):
+            for i in range(500):
+                store.record_score(f"user_{n}_{i % 50}", "数学", 10)
+        
+        def reader():
+            for _ in range(500):
+                top = store.global_board.top(10)
+                assert [score for _, score in top] == sorted((score for _, score in top), reverse=True)
+        
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        threads += [threading.Thread(target=reader) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(store.global_board) == 3 + 4 * 50
+        assert store.global_board.get_score("user_0_0") == 100
+        
+        assert store.snapshot()
+        assert not store.snapshot()  # 无更新时跳过
+        
+        restored = LeaderboardStore(store.snapshot_path)
+        assert restored.restore()
+        assert restored.global_board.top(300) == store.global_board.top(300)
+        assert restored.get_board("中国历史").top(10) == [("bob", 10), ("carol", 0)]
+    
+    print("✅ 排行榜名次、并发读写和快照恢复正常")
+
+def test_repeated_answers_not_counted():
+    """测试同一用户重复提交同一题只计第一次"""
+    print("\n🔁 测试重复作答去重...")
+    
+    import tempfile
+    from pathlib import Path
+    from fastapi.testclient import TestClient
+    import app as app_module
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LeaderboardStore(str(Path(tmp, "leaderboards.json")), str(Path(tmp, "answered.jsonl")))
+        assert store.record_answer("alice", "q_1", "数学", 10)
+        assert not store.record_answer("alice", "q_1", "数学", 10)
+        assert store.record_answer("bob", "q_1", "数学", 0)
+        assert store.global_board.get_score("alice") == 10
+        store.snapshot()
+        assert store.record_answer("alice", "q_2", "数学", 10)
+        store.snapshot()
+        
+        # 排行榜快照只保存分数，去重记录逐条追加到单独的文件
+        assert set(json.loads(store.snapshot_path.read_bytes())) == {"global", "topics"}
+        assert len(store.answered_path.read_bytes().splitlines()) == 3
+        # 写入中断留下的不完整行在恢复时被跳过
+        with open(store.answered_path, "ab") as f:
+            f.write(b'["carol", "q_')
+        
+        # 重启后已作答记录从去重记录文件恢复
+        restored = LeaderboardStore(store.snapshot_path, store.answered_path)
+        restored.restore()
+        assert restored.answered == {"alice": {"q_1", "q_2"}, "bob": {"q_1"}}
+        assert not restored.record_answer("alice", "q_1", "数学", 10)
+        assert restored.global_board.get_score("alice") == 20
+    
+    # 通过接口重复提交，排行榜和题目分析都只记录一次
+    leaderboards, analyzer = app_module.leaderboards, app_module.item_analyzer
+    app_module.leaderboards, app_module.item_analyzer = LeaderboardStore(), ItemAnalyzer()
+    app_module.quiz_storage["dedup_question"] = {"correct_answer": "B", "explanation": "", "topic": "数学"}
+    try:
+        client = TestClient(app_module.app)
+        for _ in range(3):
+            response = client.post(
+                "/api/submit-answer",
+                json={"question_id": "dedup_question", "selected_answer": "B", "user_id": "carol"},
+            )
+            assert response.status_code == 200 and response.json()["is_correct"]
+        # 带空格的小写选项与题目分析按同一规范化结果判定
+        response = client.post(
+            "/api/submit-answer",
+            json={"question_id": "dedup_question", "selected_answer": " b ", "user_id": "dave"},
+        )
+        assert response.status_code == 200 and response.json()["is_correct"]
+        app_module.item_analyzer.refresh()
+        assert app_module.leaderboards.global_board.get_score("carol") == 10
+        assert app_module.leaderboards.global_board.get_score("dave") == 10
+        assert len(app_module.item_analyzer) == 2
+        assert app_module.item_analyzer.p_values[0] == 1.0
+    finally:
+        del app_module.quiz_storage["dedup_question"]
+        app_module.leaderboards, app_module.item_analyzer = leaderboards, analyzer
+    
+    print("✅ 重复作答只计入一次")
+
+def test_item_analysis():
+    """测试题目分析：p值、选项分布、区分度、标记和增量更新"""
+    print("\n📊 测试题目分析...")
+    
+    import tempfile
+    from pathlib import Path
+    import numpy as np
+    
+    analyzer = ItemAnalyzer(min_answers=4, min_wrong_answers=3)
+    # 高分用户u1、u2答对q_good和q_other，低分用户u3、u4答错；q_easy人人答对；q_key所有人都选C，而记录的正确答案是A
+    records = [
+        ("q_good", "B", "B", True, "u1"), ("q_good", "B", "B", True, "u2"),
+        ("q_good", "A", "B", False, "u3"), ("q_good", "C", "B", False, "u4"),
+        ("q_other", "A", "A", True, "u1"), ("q_other", "A", "A", True, "u2"),
+        ("q_other", "B", "A", False, "u3"), ("q_other", "D", "A", False, "u4"),
+        ("q_easy", "D", "D", True, "u1"), ("q_easy", "D", "D", True, "u2"),
+        ("q_easy", "D", "D", True, "u3"), ("q_easy", "D", "D", True, "u4"),
+        ("q_key", "C", "A", False, "u1"), ("q_key", "C", "A", False, "u2"),
+        ("q_key", "C", "A", False, "u3"),
+    ]
+    analyzer.extend(*zip(*records))
+    analyzer.refresh()
+    # q_key第4次作答通过record增量写入
+    analyzer.record("q_key", "c", "A", False, "u4")
+    analyzer.refresh()
+    
+    report = {row["question_id"]: row for row in analyzer.report()}
+    assert len(analyzer) == 16
+    assert report["q_good"]["p_value"] == 0.5
+    assert report["q_good"]["option_distribution"] == {"A": 0.25, "B": 0.5, "C": 0.25, "D": 0.0}
+    assert report["q_good"]["discrimination"] > 0.9
+    assert report["q_easy"]["flags"] == ["too_easy", "unused_distractor"]
+    assert report["q_key"]["flags"] == ["too_hard", "suspect_key", "unused_distractor"]
+    # 4次作答无法覆盖全部干扰项，q_good只有报告用的弱干扰项标记，仍继续下发
+    assert report["q_good"]["flags"] == ["unused_distractor"]
+    assert analyzer.is_retired("q_key") and analyzer.is_retired("q_easy")
+    assert not analyzer.is_retired("q_good") and not analyzer.is_retired("q_other")
+    
+    # 与逐条计算的点二列相关结果一致
+    user_correct = {"u1": 3, "u2": 3, "u3": 1, "u4": 1}
+    xs = [1, 1, 0, 0]
+    ys = [(user_correct[u] - x) / 3 for u, x in zip(["u1", "u2", "u3", "u4"], xs)]
+    assert abs(report["q_good"]["discrimination"] - np.corrcoef(xs, ys)[0, 1]) < 1e-4
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp, "answers.npz"))
+        assert analyzer.save(path)
+        assert not analyzer.save(path)  # 没有新记录时跳过
+        restored = ItemAnalyzer(min_answers=4, min_wrong_answers=3)
+        assert restored.load(path)
+        assert restored.report() == analyzer.report()
+        assert not restored.save(path)
+        restored.record("q_good", "B", "B", True, "u5")
+        assert restored.save(path)
+    
+    print("✅ 题目分析指标、标记和增量更新正常")
+
+def test_answer_log_saved_periodically():
+    """测试应用运行期间答题记录会定期保存，而不是只在停止时保存"""
+    print("\n💾 测试答题记录定期保存...")
+    
+    import tempfile
+    import time
+    from pathlib import Path
+    from fastapi.testclient import TestClient
+    import app as app_module
+    
+    saved = {name: getattr(app_module, name) for name in (
+        "structured_logging", "leaderboards", "item_analyzer", "ANSWER_LOG_PATH", "ANSWER_LOG_SAVE_INTERVAL",
+    )}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp, "answers.npz")
+        app_module.structured_logging = StructuredLogging(log_dir=tmp)
+        app_module.leaderboards = LeaderboardStore()
+        app_module.item_analyzer = ItemAnalyzer()
+        app_module.ANSWER_LOG_PATH = str(path)
+        app_module.ANSWER_LOG_SAVE_INTERVAL = 0.05
+        app_module.quiz_storage["periodic_question"] = {"correct_answer": "A", "explanation": "", "topic": "数学"}
+        try:
+            with TestClient(app_module.app) as client:
+                client.post(
+                    "/api/submit-answer",
+                    json={"question_id": "periodic_question", "selected_answer": "A", "user_id": "dave"},
+                )
+                deadline = time.time() + 5
+                while not path.exists() and time.time() < deadline:
+                    time.sleep(0.05)
+                # 应用仍在运行时文件已写入
+                assert path.exists()
+            restored = ItemAnalyzer()
+            assert restored.load(str(path)) and len(restored) == 1
+        finally:
+            del app_module.quiz_storage["periodic_question"]
+            for name, value in saved.items():
+                setattr(app_module, name, value)
+    
+    print("✅ 答题记录已定期保存")
+
+def test_retired_question_survives_restart():
+    """测试被标记的题目在重启（新进程、不同哈希种子）后仍不再下发"""
+    print("\n♻️ 测试重启后题目标记保持...")
+    
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    from pathlib import Path
+    
+    bad_question = {
+        "question": "圆的面积公式是？",
+        "options": {"A": "2πr", "B": "πd", "C": "πr²", "D": "πr"},
+        "correct_answer": "A",
+        "explanation": "错误的正确答案",
+    }
+    good_question = {
+        "question": "2的3次方等于多少？",
+        "options": {"A": "6", "B": "8", "C": "9", "D": "12"},
+        "correct_answer": "B",
+        "explanation": "2 × 2 × 2 = 8",
+    }
+    response_text = json.dumps({"questions": [bad_question, good_question]}, ensure_ascii=False)
+    
+    # 在新进程中运行，题目ID与进程的字符串哈希种子无关
+    script = """
+import asyncio, json, sys
+import app
+from item_analysis import ItemAnalyzer
+
+mode, path, response_text = sys.argv[1], sys.argv[2], sys.stdin.read()
+bad_id = app.quiz_generator._parse_quiz_response(response_text)[0].question_id
+if mode == "record":
+    analyzer = ItemAnalyzer()
+    for i in range(40):
+        analyzer.record(bad_id, "C", "A", False, f"user_{i}")
+    analyzer.refresh()
+    assert analyzer.is_retired(bad_id)
+    analyzer.save(path)
+else:
+    app.item_analyzer.load(path)
+    async def fake_generate(topic, difficulty, question_count):
+        return app.quiz_generator._parse_quiz_response(response_text)
+    app.quiz_generator.generate_quiz = fake_generate
+    response = asyncio.run(app.generate_quiz(app.QuizRequest(topic="数学", question_count=2)))
+    print(json.dumps([q["question"] for q in json.loads(response.body)], ensure_ascii=False))
+"""
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp, "answers.npz"))
+        outputs = []
+        for mode, seed in (("record", "1"), ("serve", "2")):
+            result = subprocess.run(
+                [sys.executable, "-c", script, mode, path],
+                input=response_text, capture_output=True, text=True, encoding="utf-8",
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env={**os.environ, "PYTHONHASHSEED": seed, "LOG_DIR": tmp},
+            )
+            assert result.returncode == 0, result.stderr
+            outputs.append(result.stdout.strip().splitlines())
+    
+    assert json.loads(outputs[1][-1]) == [good_question["question"]]
+    print("✅ 重启后被标记的题目仍被过滤")
+
 async def main():
     """主测试函数"""
     print("🚀 开始Dify Quiz Chat应用测试")
@@ -182,6 +578,22 @@ async def main():
     # 测试题目生成
     await test_quiz_generation()
     
+    # 测试快速JSON响应
+    test_fast_response()
+    
+    # 测试结构化日志
+    test_structured_logging()
+    test_request_logging_on_error()
+    
+    # 测试排行榜
+    test_leaderboard()
+    test_repeated_answers_not_counted()
+    
+    # 测试题目分析
+    test_item_analysis()
+    test_answer_log_saved_periodically()
+    test_retired_question_survives_restart()
+    
     # 测试API端点（需要应用运行）
     print("\n" + "=" * 50)
     print("💡 提示：要测试API端点，请先启动应用：")